@@ -1,26 +1,29 @@
 #!/usr/bin/env python3
 """
 Hardcoded DOCX snippet generators for each accessibility issue
+
+The snippets never change, so each generator is memoized and builds its
+DOCX (zip + base64) only once per process.
 """
 
 from docx import Document
 import docx.shared
 import base64
+import re
+from functools import lru_cache
 from io import BytesIO
 
 def docx_to_base64(doc):
     """Helper function to convert DOCX document to base64"""
-    try:
-        buffer = BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        docx_data = buffer.getvalue()
-        return base64.b64encode(docx_data).decode('utf-8')
-    except Exception as e:
-        print(f"Error converting DOCX to base64: {e}")
-        return None
+    # Errors propagate so the memoized generators never cache a failed result;
+    # get_hardcoded_snippets reports them and returns None for that call only
+    buffer = BytesIO()
+    doc.save(buffer)
+    # Encode straight from the buffer's memory rather than a bytes copy of it
+    return base64.b64encode(buffer.getbuffer()).decode('ascii')
 
 # Issue 1: Title contrast
+@lru_cache(maxsize=1)
 def create_title_original_snippet():
     """Title with poor contrast (original problem)"""
     doc = Document()
@@ -29,6 +32,7 @@ def create_title_original_snippet():
         title.runs[0].font.color.rgb = docx.shared.RGBColor(200, 200, 200)  # Poor contrast gray
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_title_fixed_snippet():
     """Title with good contrast (fixed)"""
     doc = Document()
@@ -39,12 +43,14 @@ def create_title_fixed_snippet():
     return docx_to_base64(doc)
 
 # Issue 2: Paragraph should be heading
+@lru_cache(maxsize=1)
 def create_paragraph_original_snippet():
     """Paragraph that should be heading (original problem)"""
     doc = Document()
     doc.add_paragraph('This is a paragraph that should be a heading.')  # Wrong: paragraph
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_paragraph_fixed_snippet():
     """Paragraph converted to proper heading (fixed)"""
     doc = Document()
@@ -54,12 +60,14 @@ def create_paragraph_fixed_snippet():
     return docx_to_base64(doc)
 
 # Issue 3: Wrong heading hierarchy
+@lru_cache(maxsize=1)
 def create_hierarchy_original_snippet():
     """Wrong heading hierarchy (original problem)"""
     doc = Document()
     doc.add_heading('Subsection', level=3)  # Wrong: H3 without H1/H2
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_hierarchy_fixed_snippet():
     """Proper heading hierarchy (fixed)"""
     doc = Document()
@@ -69,6 +77,7 @@ def create_hierarchy_fixed_snippet():
     return docx_to_base64(doc)
 
 # Issue 4: Text contrast
+@lru_cache(maxsize=1)
 def create_text_original_snippet():
     """Text with poor contrast (original problem)"""
     doc = Document()
@@ -77,6 +86,7 @@ def create_text_original_snippet():
         p.runs[0].font.color.rgb = docx.shared.RGBColor(180, 180, 180)  # Very light gray
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_text_fixed_snippet():
     """Text with good contrast (fixed)"""
     doc = Document()
@@ -88,12 +98,14 @@ def create_text_fixed_snippet():
     return docx_to_base64(doc)
 
 # Issue 5: Alt text
+@lru_cache(maxsize=1)
 def create_alt_original_snippet():
     """Missing alt text reference (original problem)"""
     doc = Document()
     doc.add_paragraph('Please refer to the chart below for more information.')  # Vague reference
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_alt_fixed_snippet():
     """Descriptive content (fixed)"""
     doc = Document()
@@ -103,6 +115,7 @@ def create_alt_fixed_snippet():
     return docx_to_base64(doc)
 
 # Issue 6: Table headers
+@lru_cache(maxsize=1)
 def create_table_original_snippet():
     """Table without headers (original problem)"""
     doc = Document()
@@ -113,6 +126,7 @@ def create_table_original_snippet():
             cell.text = f'Data {i+1}-{j+1}'  # No headers, just data
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_table_fixed_snippet():
     """Table with proper headers (fixed)"""
     doc = Document()
@@ -142,6 +156,7 @@ def create_table_fixed_snippet():
     return docx_to_base64(doc)
 
 # Issue 7: Link text
+@lru_cache(maxsize=1)
 def create_link_original_snippet():
     """Non-descriptive link text (original problem)"""
     doc = Document()
@@ -152,6 +167,7 @@ def create_link_original_snippet():
     p.add_run(' for more information.')
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_link_fixed_snippet():
     """Descriptive link text (fixed)"""
     doc = Document()
@@ -163,6 +179,7 @@ def create_link_fixed_snippet():
     return docx_to_base64(doc)
 
 # Issue 8: Font size
+@lru_cache(maxsize=1)
 def create_font_original_snippet():
     """Text too small (original problem)"""
     doc = Document()
@@ -171,6 +188,7 @@ def create_font_original_snippet():
         p.runs[0].font.size = docx.shared.Pt(6)  # Very small font
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
 def create_font_fixed_snippet():
     """Readable font size (fixed)"""
     doc = Document()
@@ -180,72 +198,52 @@ def create_font_fixed_snippet():
         p.runs[0].font.name = 'Calibri'
     return docx_to_base64(doc)
 
+@lru_cache(maxsize=1)
+def create_default_snippet():
+    """Placeholder used for both sides when the issue type is not recognized"""
+    doc = Document()
+    doc.add_paragraph('Default snippet - issue type not recognized')
+    return docx_to_base64(doc)
+
+# Element token from the issue's XPath -> (terms its description must all contain,
+# (original, fixed) snippet generators). 'alt' also covers 'alternative'.
+SNIPPET_DISPATCH = {
+    '//w:p[1]': (('color contrast',), (create_title_original_snippet, create_title_fixed_snippet)),
+    '//w:p[2]': (('paragraph', 'heading'), (create_paragraph_original_snippet, create_paragraph_fixed_snippet)),
+    '//w:p[3]': (('heading hierarchy',), (create_hierarchy_original_snippet, create_hierarchy_fixed_snippet)),
+    '//w:p[4]': (('color contrast',), (create_text_original_snippet, create_text_fixed_snippet)),
+    '//w:p[5]': (('alt',), (create_alt_original_snippet, create_alt_fixed_snippet)),
+    '//w:tbl[1]': (('table',), (create_table_original_snippet, create_table_fixed_snippet)),
+    '//w:p[6]': (('link',), (create_link_original_snippet, create_link_fixed_snippet)),
+    '//w:p[7]': (('too small',), (create_font_original_snippet, create_font_fixed_snippet)),
+}
+
+ELEMENT_TOKEN_RE = re.compile(r'//w:\w+\[\d+\]')
+
 def get_hardcoded_snippets(issue_id, issue_context):
     """Get hardcoded DOCX snippets based on issue type"""
     try:
-        clause = issue_context.get('clause', '')
         element_xpath = issue_context.get('element_xpath', '')
         description = issue_context.get('description', '').lower()  # Make case-insensitive
         
-        # Map issues to snippet generators based on clause and xpath
-        if '//w:p[1]' in element_xpath and 'color contrast' in description:
-            # Issue 1: Title contrast
-            return {
-                'original': create_title_original_snippet(),
-                'fixed': create_title_fixed_snippet()
-            }
-        elif '//w:p[2]' in element_xpath and 'paragraph' in description and 'heading' in description:
-            # Issue 2: Paragraph to heading
-            return {
-                'original': create_paragraph_original_snippet(),
-                'fixed': create_paragraph_fixed_snippet()
-            }
-        elif '//w:p[3]' in element_xpath and 'heading hierarchy' in description:
-            # Issue 3: Heading hierarchy
-            return {
-                'original': create_hierarchy_original_snippet(),
-                'fixed': create_hierarchy_fixed_snippet()
-            }
-        elif '//w:p[4]' in element_xpath and 'color contrast' in description:
-            # Issue 4: Text contrast
-            return {
-                'original': create_text_original_snippet(),
-                'fixed': create_text_fixed_snippet()
-            }
-        elif '//w:p[5]' in element_xpath and ('alt' in description or 'alternative' in description):
-            # Issue 5: Alt text
-            return {
-                'original': create_alt_original_snippet(),
-                'fixed': create_alt_fixed_snippet()
-            }
-        elif '//w:tbl[1]' in element_xpath and 'table' in description:
-            # Issue 6: Table headers
-            return {
-                'original': create_table_original_snippet(),
-                'fixed': create_table_fixed_snippet()
-            }
-        elif '//w:p[6]' in element_xpath and 'link' in description:
-            # Issue 7: Link text
-            return {
-                'original': create_link_original_snippet(),
-                'fixed': create_link_fixed_snippet()
-            }
-        elif '//w:p[7]' in element_xpath and 'too small' in description:
-            # Issue 8: Font size
-            return {
-                'original': create_font_original_snippet(),
-                'fixed': create_font_fixed_snippet()
-            }
-        else:
-            # Default fallback
-            doc = Document()
-            doc.add_paragraph('Default snippet - issue type not recognized')
-            default_snippet = docx_to_base64(doc)
+        # Map issues to snippet generators based on xpath and description
+        token = ELEMENT_TOKEN_RE.search(element_xpath)
+        entry = SNIPPET_DISPATCH.get(token.group()) if token else None
+        
+        if entry and all(term in description for term in entry[0]):
+            create_original, create_fixed = entry[1]
             return {
-                'original': default_snippet,
-                'fixed': default_snippet
+                'original': create_original(),
+                'fixed': create_fixed()
             }
+        
+        # Default fallback
+        default_snippet = create_default_snippet()
+        return {
+            'original': default_snippet,
+            'fixed': default_snippet
+        }
             
     except Exception as e:
         print(f"Error getting hardcoded snippets: {e}")
-        return None
\ No newline at end of file
+        return None
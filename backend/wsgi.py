@@ -0,0 +1,6 @@
+from app import app
+
+# Entry point for production WSGI servers. Documents, issues and staged changes
+# live in process memory, so run a single worker process and scale with threads:
+#   gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:5000 wsgi:application
+application = app